@@ -1,22 +1,161 @@
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, request, render_template
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime
+from apscheduler.jobstores.base import JobLookupError
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+import logging
 import os
+import threading
+import time
 import db
 
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+logger = logging.getLogger("killswitch")
+
+# APScheduler logs every job run at INFO - keep its output to warnings and errors
+logging.getLogger("apscheduler").setLevel(logging.WARNING)
+
 app = Flask(__name__)
 
-# Timezone Configuration
-TIMEZONE = os.getenv("TIMEZONE", "America/New_York")
+def jsonify(data):
+    """Drop-in for flask.jsonify that serializes with orjson (status/debug payloads are polled)"""
+    return app.response_class(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS), mimetype="application/json")
+
+def override_to_json(override):
+    """Copy of a temporary access / punishment mode row with its epoch *_at times as ISO strings, or {} for none"""
+    if not override:
+        return {}
+    return {
+        key: db.from_epoch(value).isoformat() if key.endswith("_at") and value is not None else value
+        for key, value in override.items()
+    }
+
+# Seconds to wait for a switch to (connect, respond) before giving up - connecting
+# should be near-instant on the LAN, so a dead switch fails fast
+SWITCH_TIMEOUT = (
+    float(os.getenv("SWITCH_CONNECT_TIMEOUT", "3.05")),
+    float(os.getenv("SWITCH_TIMEOUT", "10"))
+)
+
+# Seconds to wait before retrying a failed switch update
+SYNC_RETRY_SECONDS = 60
+
+# Minutes between full safety-net syncs, in case a boundary job was missed (0 disables)
+SYNC_SAFETY_NET_MINUTES = int(os.getenv("SYNC_SAFETY_NET_MINUTES", "5"))
+
+# Switches a sync updates at the same time
+SYNC_WORKERS = 8
+
+# Seconds a sync waits for the switches before leaving slow ones to finish on their own
+SYNC_WAIT_SECONDS = 45
+
+# Minutes a switch session may sit unused before we log in again up front instead of just trying it
+SWITCH_SESSION_MAX_AGE = int(os.getenv("SWITCH_SESSION_MAX_AGE", "10"))
+
+# Minutes between background probes that keep switch logins warm (0 disables)
+SWITCH_KEEPALIVE_MINUTES = int(os.getenv("SWITCH_KEEPALIVE_MINUTES", "5"))
+
+# Keep-alive connections kept per device - port changes to a device are serialized by its
+# device lock and the keep-alive probe is the only other caller, so two covers it without
+# holding idle sockets open on the switch's small embedded web server
+SWITCH_POOL_SIZE = int(os.getenv("SWITCH_POOL_SIZE", "2"))
+
+# Retries for connection errors and gateway errors from a switch, including the logon.cgi POST
+# (logging in again is harmless); after the last retry the error response is returned as usual
+SWITCH_RETRIES = Retry(
+    total=2,
+    backoff_factor=0.3,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset(["GET", "HEAD", "POST"]),
+    raise_on_status=False
+)
 
 # Port state cache for all devices (keyed by device_id)
 port_states = {}
 
+# One lock per device (keyed by device_id), held while reading its port state, updating
+# the switch and storing the result - different switches can be updated in parallel
+device_locks = {}
+
+# Guards creating entries in the per-device lock tables
+device_locks_guard = threading.Lock()
+
+# Idempotency key of the last applied toggle per device (keyed by device_id)
+last_toggle_ids = {}
+
+# Devices whose last sync failed to update the switch and need a retry
+pending_retries = set()
+
+# Latest desired state per device waiting to be applied: device_id -> (device, should_be_enabled)
+pending_states = {}
+
+# Held by the one sync currently applying pending_states to the switches
+sync_lock = threading.Lock()
+
+# Threads a sync uses to update several switches at once
+sync_pool = ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix="switch-sync")
+
+# HTTP session per device (keyed by device_id) - keeps connections alive and
+# holds that switch's H_P_SSID cookie between calls
+switch_sessions = {}
+
+# Guards creating and dropping entries in switch_sessions
+switch_sessions_lock = threading.Lock()
+
+# Last time each device's switch session was known good - a login or a successful call (keyed by device_id)
+switch_last_used = {}
+
+# Per-device login locks so concurrent callers share one login instead of each posting logon.cgi
+login_locks = {}
+
 # Initialize scheduler
-scheduler = BackgroundScheduler()
+# Uses the configured timezone (resolved once in db) rather than looking up the host's
+scheduler = BackgroundScheduler(timezone=db.LOCAL_TZ)
 scheduler.start()
 
+def cached_port_state(device_id):
+    """Return a device's cached port state, starting it as disabled if not known yet"""
+    # setdefault is atomic, so a reader can't overwrite a state another thread just stored
+    return port_states.setdefault(device_id, {"enabled": False})
+
+def get_device_lock(locks, device_id):
+    """Return a device's lock from a per-device lock table, creating it on first use"""
+    with device_locks_guard:
+        lock = locks.get(device_id)
+        if lock is None:
+            lock = locks[device_id] = threading.Lock()
+        return lock
+
+def get_switch_session(device_config):
+    """Return the device's HTTP session, creating it on first use"""
+    with switch_sessions_lock:
+        session = switch_sessions.get(device_config['id'])
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=SWITCH_POOL_SIZE, max_retries=SWITCH_RETRIES))
+            switch_sessions[device_config['id']] = session
+        return session
+
+def drop_switch_session(device_id):
+    """Discard a device's HTTP session and login so the next call starts fresh"""
+    with switch_sessions_lock:
+        session = switch_sessions.pop(device_id, None)
+        switch_last_used.pop(device_id, None)
+    if session is not None:
+        session.close()
+
+def has_session_cookie(device_config):
+    """Check if the device's session holds a login cookie for its switch"""
+    session = switch_sessions.get(device_config['id'])
+    return session is not None and any(cookie.name == "H_P_SSID" for cookie in session.cookies)
+
 def login_to_switch(device_config):
     """Login to a switch using device configuration"""
     login_url = f"http://{device_config['ip']}/logon.cgi"
@@ -26,22 +165,95 @@ def login_to_switch(device_config):
         "cpassword": "",
         "logon": "Login"
     }
-    session = requests.Session()
-    response = session.post(login_url, data=payload, verify=False)
-    if response.status_code == 200 and "H_P_SSID" in session.cookies:
+    session = get_switch_session(device_config)
+    response = session.post(login_url, data=payload, timeout=SWITCH_TIMEOUT)
+    if response.status_code == 200 and has_session_cookie(device_config):
+        switch_last_used[device_config['id']] = time.monotonic()
         return session
     else:
+        switch_last_used.pop(device_config['id'], None)
         raise Exception(f"Failed to log in to switch {device_config['alias']}")
 
-def control_port(session, device_config, enable):
+def is_logged_in(device_config):
+    """Check if the device's session has a login that hasn't sat unused for too long"""
+    last_used = switch_last_used.get(device_config['id'])
+    return (last_used is not None
+            and time.monotonic() - last_used <= SWITCH_SESSION_MAX_AGE * 60
+            and has_session_cookie(device_config))
+
+def ensure_logged_in(device_config):
+    """Return the device's session, logging in only if the switch login is missing or has sat unused"""
+    if is_logged_in(device_config):
+        return get_switch_session(device_config)
+
+    with get_device_lock(login_locks, device_config['id']):
+        # Another thread may have logged in while we were waiting
+        if is_logged_in(device_config):
+            return get_switch_session(device_config)
+        return login_to_switch(device_config)
+
+def switch_request(session, url, probe=False):
+    """
+    GET a switch page - or for a probe only its headers, with HEAD, falling back to a
+    GET that's closed without reading the body if the switch doesn't support HEAD
+    """
+    if not probe:
+        return session.get(url, timeout=SWITCH_TIMEOUT)
+
+    response = session.head(url, allow_redirects=True, timeout=SWITCH_TIMEOUT)
+    if response.status_code in (405, 501):
+        response = session.get(url, stream=True, timeout=SWITCH_TIMEOUT)
+        response.close()
+    return response
+
+def switch_call(device_config, url, probe=False):
+    """
+    Request a page from a switch on the device's session and return the response, or None
+    Just tries the request while the session is in use; logs in first only if it has sat
+    unused for SWITCH_SESSION_MAX_AGE minutes, and if the switch sends us back to its
+    login page, logs in on a fresh session and retries once
+    With probe=True only the headers are fetched (see switch_request)
+    """
+    device_id = device_config['id']
+    response = switch_request(ensure_logged_in(device_config), url, probe)
+    if response.status_code == 200 and "logon.cgi" not in response.url:
+        switch_last_used[device_id] = time.monotonic()
+        return response
+
+    # Session expired on the switch - start over and try once more
+    drop_switch_session(device_id)
+    response = switch_request(ensure_logged_in(device_config), url, probe)
+    if response.status_code == 200 and "logon.cgi" not in response.url:
+        switch_last_used[device_id] = time.monotonic()
+        return response
+
+    # Force a fresh login next time
+    drop_switch_session(device_id)
+    return None
+
+def keep_switch_sessions_warm():
+    """
+    Background job that touches every switch so its login and keep-alive connection
+    stay warm, and user actions don't pay for a fresh login after the app has been idle
+    """
+    try:
+        devices = db.get_devices()
+    except Exception as e:
+        logger.error("[KEEPALIVE] ERROR: %s", e)
+        return
+
+    for device in devices:
+        try:
+            if switch_call(device, f"http://{device['ip']}/", probe=True) is None:
+                logger.warning("[KEEPALIVE] %s: FAILED - Switch did not accept our login", device['alias'])
+        except Exception as e:
+            logger.error("[KEEPALIVE] %s: ERROR - %s", device['alias'], e)
+
+def control_port(device_config, enable):
     """Control a port on a switch"""
     state = 1 if enable else 0
     port_url = f"http://{device_config['ip']}/port_setting.cgi?portid={device_config['port_id']}&state={state}&speed=1&flowcontrol=0&apply=Apply"
-    response = session.get(port_url, verify=False)
-    if response.status_code == 200:
-        return True
-    else:
-        return False
+    return switch_call(device_config, port_url) is not None
 
 def get_device_id_from_request():
     """Extract device_id from request (query param or JSON body), default to default device"""
@@ -62,18 +274,14 @@ def get_device_id_from_request():
 
 def sync_port_with_schedule(device_id=None):
     """
-    Background job to sync port state with schedules
-    This runs every minute to check if the port should be enabled/disabled
+    Sync port state with schedules
+    Runs as a scheduler job whenever a device's desired state can change (see schedule_next_sync)
+    and immediately after any change to schedules, temporary access or punishment mode
     If device_id is None, syncs all devices
     """
-    global port_states
     try:
         now = db.get_local_now()
-        print(f"[SCHEDULER] Running sync check at {now.strftime('%Y-%m-%d %H:%M:%S')}")
-
-        # Cleanup expired temporary access and punishment mode for all devices
-        db.cleanup_expired_temporary_access()
-        db.cleanup_expired_punishment_mode()
+        logger.info("[SCHEDULER] Running sync check at %s", now.strftime('%Y-%m-%d %H:%M:%S'))
 
         # Get devices to sync
         if device_id is None:
@@ -82,37 +290,119 @@ def sync_port_with_schedule(device_id=None):
             device = db.get_device(device_id)
             devices = [device] if device else []
 
+        # Read every device's desired state at once
+        desired_states = db.snapshot_desired_states([device['id'] for device in devices], now)
+
+        # Queue the latest desired state for each device
         for device in devices:
-            dev_id = device['id']
-            alias = device['alias']
-
-            # Initialize port state if not exists
-            if dev_id not in port_states:
-                port_states[dev_id] = {"enabled": False}
-
-            # Determine if port should be enabled
-            should_be_enabled = db.should_port_be_enabled(dev_id)
-            current_state = port_states[dev_id]["enabled"]
-            print(f"[SCHEDULER] {alias}: Current={current_state}, Should be={should_be_enabled}")
-
-            # Only update if state needs to change
-            if current_state != should_be_enabled:
-                print(f"[SCHEDULER] {alias}: State change needed, updating switch...")
-                try:
-                    session = login_to_switch(device)
-                    success = control_port(session, device, should_be_enabled)
-                    if success:
-                        port_states[dev_id]["enabled"] = should_be_enabled
-                        print(f"[SCHEDULER] {alias}: SUCCESS - Port synced to {'enabled' if should_be_enabled else 'disabled'}")
-                    else:
-                        print(f"[SCHEDULER] {alias}: FAILED - Could not update switch")
-                except Exception as e:
-                    print(f"[SCHEDULER] {alias}: ERROR - {e}")
-            else:
-                print(f"[SCHEDULER] {alias}: No change needed")
+            pending_states[device['id']] = (device, desired_states[device['id']])
+
+    except Exception as e:
+        logger.error("[SCHEDULER] ERROR: %s", e)
+
+    apply_pending_states()
+    schedule_next_sync()
+
+def apply_desired_state(device_id, should_be_enabled):
+    """
+    Apply a desired state that is already known (e.g. returned by a db write) to a device's
+    switch without re-reading the database, then re-arm the scheduler for the new next transition
+    """
+    device = db.get_device(device_id)
+    if device:
+        pending_states[device_id] = (device, should_be_enabled)
+        apply_pending_states()
+    schedule_next_sync()
+
+def apply_pending_states():
+    """
+    Apply queued desired states to the switches, one sync at a time
+    If another sync is already applying, it picks up our queued states instead,
+    so overlapping calls collapse into a single switch write per device
+    Devices are updated in parallel so one slow switch doesn't hold up the rest
+    """
+    while pending_states:
+        if not sync_lock.acquire(blocking=False):
+            logger.info("[SCHEDULER] Sync already in progress - handed off queued changes")
+            return
+
+        try:
+            while pending_states:
+                futures = {}
+                while pending_states:
+                    dev_id, (device, should_be_enabled) = pending_states.popitem()
+                    futures[sync_pool.submit(sync_one_device, device, should_be_enabled)] = device
+
+                _, not_done = wait(futures, timeout=SYNC_WAIT_SECONDS)
+                for future in not_done:
+                    device = futures[future]
+                    pending_retries.add(device['id'])
+                    logger.warning("[SCHEDULER] %s: TIMEOUT - Switch still updating after %ss", device['alias'], SYNC_WAIT_SECONDS)
+        finally:
+            sync_lock.release()
+
+def sync_one_device(device, should_be_enabled):
+    """Bring one device's switch to its desired state (runs on sync_pool)"""
+    global port_states
+    dev_id = device['id']
+    alias = device['alias']
+
+    with get_device_lock(device_locks, dev_id):
+        current_state = cached_port_state(dev_id)["enabled"]
+        logger.debug("[SCHEDULER] %s: Current=%s, Should be=%s", alias, current_state, should_be_enabled)
+
+        # Only update if state needs to change
+        if current_state != should_be_enabled:
+            logger.info("[SCHEDULER] %s: State change needed, updating switch...", alias)
+            try:
+                success = control_port(device, should_be_enabled)
+                if success:
+                    port_states[dev_id]["enabled"] = should_be_enabled
+                    pending_retries.discard(dev_id)
+                    logger.info("[SCHEDULER] %s: SUCCESS - Port synced to %s", alias, 'enabled' if should_be_enabled else 'disabled')
+                else:
+                    pending_retries.add(dev_id)
+                    logger.warning("[SCHEDULER] %s: FAILED - Could not update switch", alias)
+            except Exception as e:
+                pending_retries.add(dev_id)
+                logger.error("[SCHEDULER] %s: ERROR - %s", alias, e)
+        else:
+            pending_retries.discard(dev_id)
+            logger.debug("[SCHEDULER] %s: No change needed", alias)
+
+def schedule_next_sync():
+    """
+    Arm the port sync job for the next time any device's desired state can change
+    Devices that failed to sync are retried after SYNC_RETRY_SECONDS
+    """
+    try:
+        run_date = db.next_transition_time()
+        if pending_retries:
+            retry_date = db.get_local_now() + timedelta(seconds=SYNC_RETRY_SECONDS)
+            if run_date is None or retry_date < run_date:
+                run_date = retry_date
 
+        if run_date is None:
+            try:
+                scheduler.remove_job("port_sync")
+            except JobLookupError:
+                pass
+            logger.info("[SCHEDULER] No upcoming state changes")
+            return
+
+        scheduler.add_job(
+            func=sync_port_with_schedule,
+            trigger="date",
+            run_date=run_date,
+            id="port_sync",
+            name="Sync port state with schedule",
+            replace_existing=True,
+            misfire_grace_time=30  # Allow up to 30 seconds delay without warning
+        )
+        logger.info("[SCHEDULER] Next sync at %s", run_date.strftime('%Y-%m-%d %H:%M:%S'))
     except Exception as e:
-        print(f"[SCHEDULER] ERROR: {e}")
+        logger.error("[SCHEDULER] ERROR: Could not schedule next sync: %s", e)
+
 
 @app.route("/")
 def home():
@@ -126,7 +416,7 @@ def config():
 def get_devices():
     """Get all configured devices"""
     try:
-        devices = db.get_devices()
+        devices = [dict(device) for device in db.get_devices()]
         # Don't expose passwords in API response for GET
         for device in devices:
             device.pop('password', None)
@@ -141,7 +431,7 @@ def get_device(device_id):
         device = db.get_device(device_id)
         if not device:
             return jsonify({"error": "Device not found"}), 404
-        return jsonify(device)
+        return jsonify(dict(device))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -168,9 +458,10 @@ def add_device():
             is_default=data.get("is_default", False)
         )
 
-        # Initialize port state for new device
+        # Initialize port state for new device and bring its switch in line
         global port_states
-        port_states[device_id] = {"enabled": False}
+        cached_port_state(device_id)["enabled"] = False
+        sync_port_with_schedule(device_id)
 
         return jsonify({"id": device_id, "message": "Device added successfully"})
     except Exception as e:
@@ -204,6 +495,9 @@ def update_device(device_id):
             is_default=data.get("is_default", False)
         )
 
+        # Connection details may have changed - start a fresh session
+        drop_switch_session(device_id)
+
         return jsonify({"message": "Device updated successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -224,9 +518,10 @@ def delete_device(device_id):
         db.delete_device(device_id)
 
         # Remove from port_states cache
-        global port_states
-        if device_id in port_states:
-            del port_states[device_id]
+        with get_device_lock(device_locks, device_id):
+            port_states.pop(device_id, None)
+            last_toggle_ids.pop(device_id, None)
+        drop_switch_session(device_id)
 
         return jsonify({"message": "Device deleted successfully"})
     except Exception as e:
@@ -234,18 +529,32 @@ def delete_device(device_id):
 
 @app.route("/api/port/state", methods=["GET"])
 def get_port_state():
-    """Get port state for a device"""
+    """
+    Get port state for a device
+    The dashboard polls this, so it sends an ETag and answers If-None-Match with 304 when unchanged
+    """
     try:
         device_id = get_device_id_from_request()
-        if device_id not in port_states:
-            port_states[device_id] = {"enabled": False}
-        return jsonify(port_states[device_id])
+        port_state = cached_port_state(device_id)
+
+        # The body is just the enabled flag - bump the tag scheme if fields are added
+        etag = "1" if port_state["enabled"] else "0"
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify(port_state)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/port/toggle", methods=["POST"])
 def toggle_port():
-    """Toggle port state for a device"""
+    """
+    Toggle port state for a device
+    An optional Idempotency-Key header makes retried toggles a no-op
+    """
     global port_states
     try:
         device_id = get_device_id_from_request()
@@ -253,18 +562,24 @@ def toggle_port():
         if not device:
             return jsonify({"error": "Device not found"}), 404
 
-        # Initialize port state if not exists
-        if device_id not in port_states:
-            port_states[device_id] = {"enabled": False}
+        toggle_id = request.headers.get("Idempotency-Key")
 
-        new_state = not port_states[device_id]["enabled"]
-        session = login_to_switch(device)
-        success = control_port(session, device, new_state)
-        if success:
-            port_states[device_id]["enabled"] = new_state
-            return jsonify(port_states[device_id])
-        else:
-            return jsonify({"error": "Failed to update port state"}), 500
+        with get_device_lock(device_locks, device_id):
+            port_state = cached_port_state(device_id)
+
+            # Same toggle already applied - don't flip the port back
+            if toggle_id and last_toggle_ids.get(device_id) == toggle_id:
+                return jsonify(port_state)
+
+            new_state = not port_state["enabled"]
+            success = control_port(device, new_state)
+            if success:
+                port_state["enabled"] = new_state
+                if toggle_id:
+                    last_toggle_ids[device_id] = toggle_id
+                return jsonify(port_state)
+            else:
+                return jsonify({"error": "Failed to update port state"}), 500
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -286,17 +601,19 @@ def set_port_state():
         if not device:
             return jsonify({"error": "Device not found"}), 404
 
-        # Initialize port state if not exists
-        if device_id not in port_states:
-            port_states[device_id] = {"enabled": False}
+        with get_device_lock(device_locks, device_id):
+            port_state = cached_port_state(device_id)
 
-        session = login_to_switch(device)
-        success = control_port(session, device, desired_state)
-        if success:
-            port_states[device_id]["enabled"] = desired_state
-            return jsonify(port_states[device_id])
-        else:
-            return jsonify({"error": "Failed to set port state"}), 500
+            # Port is already in the requested state - skip the switch round-trips
+            if port_state["enabled"] == desired_state:
+                return jsonify(port_state)
+
+            success = control_port(device, desired_state)
+            if success:
+                port_state["enabled"] = desired_state
+                return jsonify(port_state)
+            else:
+                return jsonify({"error": "Failed to set port state"}), 500
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -329,7 +646,42 @@ def add_schedule():
 
         device_id = get_device_id_from_request()
         schedule_id = db.add_schedule(day_of_week, start_time, end_time, device_id)
+        # Immediately sync the port state for this device (also re-arms the scheduler)
+        sync_port_with_schedule(device_id)
         return jsonify({"id": schedule_id, "message": "Schedule added successfully"})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/schedules/batch", methods=["POST"])
+def add_schedules():
+    """
+    Add several schedules at once, in a single transaction
+    Expects: { "schedules": [{ "day_of_week": 0-6, "start_time": "HH:MM", "end_time": "HH:MM" }, ...], "device_id": <optional> }
+    """
+    try:
+        data = request.get_json()
+        schedules = data.get("schedules")
+
+        if not isinstance(schedules, list) or not schedules:
+            return jsonify({"error": "schedules must be a non-empty list"}), 400
+        items = []
+        for schedule in schedules:
+            day_of_week = schedule.get("day_of_week")
+            start_time = schedule.get("start_time")
+            end_time = schedule.get("end_time")
+            if day_of_week is None or not start_time or not end_time:
+                return jsonify({"error": "day_of_week, start_time, and end_time are required for every schedule"}), 400
+            items.append((day_of_week, start_time, end_time))
+
+        device_id = get_device_id_from_request()
+        count = db.add_schedules(items, device_id)
+        # Immediately sync the port state for this device (also re-arms the scheduler)
+        sync_port_with_schedule(device_id)
+        return jsonify({"count": count, "message": "Schedules added successfully"})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -338,6 +690,8 @@ def delete_schedule(schedule_id):
     """Delete a schedule"""
     try:
         db.delete_schedule(schedule_id)
+        # Immediately sync the port state (also re-arms the scheduler)
+        sync_port_with_schedule()
         return jsonify({"message": "Schedule deleted successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -358,10 +712,10 @@ def grant_temporary_access():
             return jsonify({"error": "duration_minutes must be a positive number"}), 400
 
         device_id = get_device_id_from_request()
-        result = db.grant_temporary_access(duration_minutes, device_id)
-        # Immediately sync the port state for this device
-        sync_port_with_schedule(device_id)
-        return jsonify(result)
+        result, should_be_enabled = db.grant_temporary_access(duration_minutes, device_id)
+        # Immediately apply the new port state for this device
+        apply_desired_state(device_id, should_be_enabled)
+        return jsonify(override_to_json(result))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -371,7 +725,7 @@ def get_temporary_access():
     try:
         device_id = get_device_id_from_request()
         temp_access = db.get_active_temporary_access(device_id)
-        return jsonify(temp_access if temp_access else {})
+        return jsonify(override_to_json(temp_access))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -380,9 +734,9 @@ def revoke_temporary_access():
     """Revoke active temporary access for a device"""
     try:
         device_id = get_device_id_from_request()
-        db.revoke_temporary_access(device_id)
-        # Immediately sync the port state for this device
-        sync_port_with_schedule(device_id)
+        should_be_enabled = db.revoke_temporary_access(device_id)
+        # Immediately apply the new port state for this device
+        apply_desired_state(device_id, should_be_enabled)
         return jsonify({"message": "Temporary access revoked"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -397,12 +751,12 @@ def activate_punishment_mode():
     """
     try:
         device_id = get_device_id_from_request()
-        result = db.activate_punishment_mode(device_id)
+        result, should_be_enabled = db.activate_punishment_mode(device_id)
         if not result:
             return jsonify({"error": "No schedules configured - cannot activate punishment mode"}), 400
-        # Immediately sync the port state to disable for this device
-        sync_port_with_schedule(device_id)
-        return jsonify(result)
+        # Immediately disable the port for this device
+        apply_desired_state(device_id, should_be_enabled)
+        return jsonify(override_to_json(result))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -412,7 +766,7 @@ def get_punishment_mode():
     try:
         device_id = get_device_id_from_request()
         punishment = db.get_active_punishment_mode(device_id)
-        return jsonify(punishment if punishment else {})
+        return jsonify(override_to_json(punishment))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -421,9 +775,9 @@ def revoke_punishment_mode():
     """Revoke active punishment mode for a device"""
     try:
         device_id = get_device_id_from_request()
-        db.revoke_punishment_mode(device_id)
-        # Immediately sync the port state for this device
-        sync_port_with_schedule(device_id)
+        should_be_enabled = db.revoke_punishment_mode(device_id)
+        # Immediately apply the new port state for this device
+        apply_desired_state(device_id, should_be_enabled)
         return jsonify({"message": "Punishment mode revoked"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -433,23 +787,22 @@ def get_status():
     """Get comprehensive status including port state, schedules, and temporary access for a device"""
     try:
         device_id = get_device_id_from_request()
-        now = db.get_local_now()
+        state = db.get_full_state(device_id)
+        now = state["now"]
 
-        # Initialize port state if not exists
-        if device_id not in port_states:
-            port_states[device_id] = {"enabled": False}
+        port_state = cached_port_state(device_id)
 
         return jsonify({
-            "port_state": port_states[device_id],
-            "active_temporary_access": db.get_active_temporary_access(device_id),
-            "active_punishment_mode": db.get_active_punishment_mode(device_id),
-            "should_be_enabled": db.should_port_be_enabled(device_id),
-            "schedules_count": len(db.get_schedules(device_id)),
+            "port_state": port_state,
+            "active_temporary_access": override_to_json(state["active_temporary_access"]) or None,
+            "active_punishment_mode": override_to_json(state["active_punishment_mode"]) or None,
+            "should_be_enabled": state["should_be_enabled"],
+            "schedules_count": len(state["schedules"]),
             "debug": {
                 "current_day": now.weekday(),
                 "current_time": now.strftime("%H:%M"),
                 "current_datetime": now.isoformat(),
-                "timezone": TIMEZONE,
+                "timezone": db.TIMEZONE,
                 "device_id": device_id
             }
         })
@@ -461,16 +814,17 @@ def debug_schedule_check():
     """Debug endpoint to see schedule checking logic for a device"""
     try:
         device_id = get_device_id_from_request()
-        now = db.get_local_now()
+        state = db.get_full_state(device_id)
+        now = state["now"]
         current_day = now.weekday()
         current_time = now.strftime("%H:%M")
+        current_minute = now.hour * 60 + now.minute
 
-        schedules = db.get_schedules(device_id)
         matching_schedules = []
 
-        for schedule in schedules:
+        for schedule in state["schedules"]:
             is_today = schedule['day_of_week'] == current_day
-            time_match = schedule['start_time'] <= current_time <= schedule['end_time']
+            time_match = schedule['start_min'] <= current_minute <= schedule['end_min']
             matching_schedules.append({
                 "schedule": schedule,
                 "is_today": is_today,
@@ -486,63 +840,107 @@ def debug_schedule_check():
             'next_run': job.next_run_time.isoformat() if job.next_run_time else None
         } for job in scheduler.get_jobs()]
 
-        # Initialize port state if not exists
-        if device_id not in port_states:
-            port_states[device_id] = {"enabled": False}
+        port_state = cached_port_state(device_id)
 
         return jsonify({
             "current_day": current_day,
             "current_time": current_time,
             "current_datetime": now.isoformat(),
-            "timezone": TIMEZONE,
+            "timezone": db.TIMEZONE,
             "device_id": device_id,
-            "should_be_enabled": db.should_port_be_enabled(device_id),
+            "should_be_enabled": state["should_be_enabled"],
             "schedules": matching_schedules,
             "scheduler": {
                 "running": scheduler_running,
                 "jobs": jobs
             },
-            "port_state": port_states[device_id]
+            "port_state": port_state
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-if __name__ == "__main__":
-    # Initialize database
-    db.init_db()
-
-    # Force initial sync on startup for all devices to ensure switch matches schedule
+def startup_sync():
+    """
+    Force every switch to match its schedule - runs once in the background at startup
+    Switches are set in parallel on sync_pool, so boot time doesn't grow with the number of devices
+    """
     try:
         devices = db.get_devices()
-        for device in devices:
-            device_id = device['id']
-            alias = device['alias']
-            try:
-                should_be_enabled = db.should_port_be_enabled(device_id)
-                session = login_to_switch(device)
-                success = control_port(session, device, should_be_enabled)
-                if success:
-                    port_states[device_id] = {"enabled": should_be_enabled}
-                    print(f"Startup [{alias}]: Port initialized to {'enabled' if should_be_enabled else 'disabled'} at {db.get_local_now()}")
-                else:
-                    print(f"Warning [{alias}]: Failed to set port state on startup")
-                    port_states[device_id] = {"enabled": False}
-            except Exception as e:
-                print(f"Warning [{alias}]: Could not sync port on startup: {e}")
-                port_states[device_id] = {"enabled": False}
+        desired_states = db.snapshot_desired_states([device['id'] for device in devices])
+        futures = {
+            sync_pool.submit(startup_sync_one_device, device, desired_states[device['id']]): device
+            for device in devices
+        }
+        _, not_done = wait(futures, timeout=SYNC_WAIT_SECONDS)
+        for future in not_done:
+            device = futures[future]
+            pending_retries.add(device['id'])
+            logger.warning("[%s]: Switch still initializing after %ss", device['alias'], SYNC_WAIT_SECONDS)
     except Exception as e:
-        print(f"Warning: Could not initialize devices on startup: {e}")
+        logger.warning("Could not initialize devices on startup: %s", e)
+
+    # Arm the port sync job for the next schedule boundary or expiry (or a retry)
+    schedule_next_sync()
+
+def startup_sync_one_device(device, should_be_enabled):
+    """Force one device's switch to its desired state, whatever we think it is (runs on sync_pool)"""
+    device_id = device['id']
+    alias = device['alias']
+    with get_device_lock(device_locks, device_id):
+        try:
+            success = control_port(device, should_be_enabled)
+            if success:
+                cached_port_state(device_id)["enabled"] = should_be_enabled
+                logger.info("Startup [%s]: Port initialized to %s", alias, 'enabled' if should_be_enabled else 'disabled')
+            else:
+                logger.warning("[%s]: Failed to set port state on startup", alias)
+                cached_port_state(device_id)["enabled"] = False
+                pending_retries.add(device_id)
+        except Exception as e:
+            logger.warning("[%s]: Could not sync port on startup: %s", alias, e)
+            cached_port_state(device_id)["enabled"] = False
+            pending_retries.add(device_id)
+
+def start_app():
+    """Initialize the database and start the background jobs (run once per process)"""
+    # Initialize database
+    db.init_db()
 
-    # Schedule the port sync job to run every minute for all devices
+    # Force initial sync for all devices to ensure switches match schedules.
+    # Runs as a scheduler job so the server starts listening without waiting on the switches.
     scheduler.add_job(
-        func=sync_port_with_schedule,
-        trigger="interval",
-        minutes=1,
-        id="port_sync",
-        name="Sync port state with schedule",
-        replace_existing=True,
-        misfire_grace_time=30,  # Allow up to 30 seconds delay without warning
-        coalesce=True  # If multiple runs are missed, only run once
+        func=startup_sync,
+        trigger="date",
+        run_date=db.get_local_now(),
+        id="startup_sync",
+        name="Sync all switches on startup",
+        replace_existing=True
     )
 
+    # Boundary jobs do the real work; this only catches a missed run or a failed re-arm
+    if SYNC_SAFETY_NET_MINUTES > 0:
+        scheduler.add_job(
+            func=sync_port_with_schedule,
+            trigger="interval",
+            minutes=SYNC_SAFETY_NET_MINUTES,
+            id="port_sync_safety_net",
+            name="Safety-net sync of all switches",
+            replace_existing=True,
+            coalesce=True  # If multiple runs are missed, only run once
+        )
+
+    if SWITCH_KEEPALIVE_MINUTES > 0:
+        scheduler.add_job(
+            func=keep_switch_sessions_warm,
+            trigger="interval",
+            minutes=SWITCH_KEEPALIVE_MINUTES,
+            id="switch_keepalive",
+            name="Keep switch sessions warm",
+            replace_existing=True,
+            coalesce=True  # If multiple runs are missed, only run once
+        )
+
+if __name__ == "__main__":
+    # Development server - production uses gunicorn via wsgi.py
+    start_app()
     app.run(host="0.0.0.0", port=5000)
@@ -1,37 +1,285 @@
 import sqlite3
+import atexit
+import logging
 import os
+import threading
+import time
+import functools
+from bisect import bisect_right
 from datetime import datetime, timedelta
 from contextlib import contextmanager
 from zoneinfo import ZoneInfo
 
+logger = logging.getLogger("killswitch.db")
+
 DB_PATH = os.getenv("DB_PATH", "killswitch.db")
 TIMEZONE = os.getenv("TIMEZONE", "America/New_York")
 
+# Prepared statements sqlite3 keeps per connection - room for every distinct query, including
+# the IN (...) variants snapshot_desired_states builds for different device counts
+STATEMENT_CACHE_SIZE = 512
+
+# Hot per-device reads, kept as constants so every call hands sqlite3 the same SQL
+# text and reuses its prepared statement instead of parsing and planning again
+SELECT_DEFAULT_DEVICE_ID_SQL = "SELECT id FROM devices WHERE is_default = 1 LIMIT 1"
+
+SELECT_DEVICE_SQL = "SELECT * FROM devices WHERE id = ?"
+
+SELECT_SCHEDULES_SQL = """
+    SELECT * FROM schedules
+    WHERE device_id = ? AND enabled = 1
+    ORDER BY day_of_week, start_min
+"""
+
+SELECT_ACTIVE_TEMPORARY_ACCESS_SQL = """
+    SELECT * FROM temporary_access
+    WHERE device_id = ? AND expires_at > ?
+    ORDER BY expires_at DESC
+    LIMIT 1
+"""
+
+SELECT_ACTIVE_PUNISHMENT_MODE_SQL = """
+    SELECT * FROM punishment_mode
+    WHERE device_id = ? AND expires_at > ?
+    ORDER BY expires_at DESC
+    LIMIT 1
+"""
+
+INSERT_SCHEDULE_SQL = """
+    INSERT OR REPLACE INTO schedules (device_id, day_of_week, start_time, end_time, enabled, start_min, end_min)
+    VALUES (?, ?, ?, ?, 1, ?, ?)
+"""
+
+# Current time as Unix epoch seconds, computed by SQLite inside the statement that stores it
+# (unixepoch() would need SQLite 3.38)
+NOW_EPOCH_SQL = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+# Extend a device's current temporary access - ?1 device, ?2 seconds to add.
+# Matches nothing when there is no unexpired grant, and grant_temporary_access inserts a new one
+EXTEND_TEMPORARY_ACCESS_SQL = f"""
+    UPDATE temporary_access
+    SET expires_at = expires_at + ?2
+    WHERE id = (
+        SELECT id FROM temporary_access
+        WHERE device_id = ?1 AND expires_at > {NOW_EPOCH_SQL}
+        ORDER BY expires_at DESC
+        LIMIT 1
+    )
+    RETURNING id, granted_at, expires_at
+"""
+
+# Start a new temporary access grant - ?1 device, ?2 its length in seconds
+INSERT_TEMPORARY_ACCESS_SQL = f"""
+    INSERT INTO temporary_access (device_id, granted_at, expires_at)
+    VALUES (?1, {NOW_EPOCH_SQL}, {NOW_EPOCH_SQL} + ?2)
+    RETURNING id, granted_at, expires_at
+"""
+
+# Soonest expiry of any active override across all devices, one column per table - ?1 is the current time
+NEXT_OVERRIDE_EXPIRY_SQL = """
+    SELECT
+        (SELECT MIN(expires_at) FROM temporary_access WHERE expires_at > ?1),
+        (SELECT MIN(expires_at) FROM punishment_mode WHERE expires_at > ?1)
+"""
+
+# Both override checks for one device in a single statement - ?1 is the device, ?2 the current time.
+# Each column is when that active override expires, or NULL if there is none
+SELECT_ACTIVE_OVERRIDES_SQL = """
+    SELECT
+        (SELECT MAX(expires_at) FROM punishment_mode
+         WHERE device_id = ?1 AND expires_at > ?2) AS punished_until,
+        (SELECT MAX(expires_at) FROM temporary_access
+         WHERE device_id = ?1 AND expires_at > ?2) AS temp_access_until
+"""
+
+# Single connection shared by all threads - opened on first use and kept for the life of the process
+db_conn = None
+
+# Serializes use of db_conn across Flask and scheduler threads (reentrant so helpers can nest)
+db_lock = threading.RLock()
+
+# How many get_db() blocks the thread holding db_lock is inside - only the outermost one cleans up
+db_depth = 0
+
+# Resolved once - get_local_now() is on every request and sync path
+LOCAL_TZ = ZoneInfo(TIMEZONE)
+
+# Seconds a memoized read stays valid (entries also expire when the minute rolls over)
+CACHE_TTL_SECONDS = 30
+
+# Memoized read results, keyed by (function name, arguments)
+read_cache = {}
+
+# Bumped on writes that can affect every device so memoized reads from before the write are discarded
+cache_generation = 0
+
+# Bumped on writes that only affect one device (keyed by device_id; None is the default device)
+device_generations = {}
+
+def cache_stamp(device_id):
+    """Version of the cached data for a device - changes on any write that affects it"""
+    return (cache_generation, device_generations.get(device_id, 0))
+
+def override_expiry(override):
+    """Epoch second an active override row stops applying (None if there is no override)"""
+    return override['expires_at'] if override else None
+
+def ttl_cached(seconds=CACHE_TTL_SECONDS, valid_until=None):
+    """
+    Memoize a per-device read for up to `seconds`, within the current minute and until
+    the next write to that device
+    Schedule windows change on minute boundaries, so results never outlive their minute;
+    `valid_until(result)` can return an earlier epoch second the result goes stale at
+    (e.g. an override's expires_at, which is not minute-aligned)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__name__, args, tuple(sorted(kwargs.items())))
+            device_id = args[0] if args else kwargs.get("device_id")
+            now = time.time()
+            minute = int(now // 60)
+            entry = read_cache.get(key)
+            if entry:
+                stamp, entry_minute, expires, until, value = entry
+                if (stamp == cache_stamp(device_id) and entry_minute == minute and time.monotonic() < expires
+                        and (until is None or now < until)):
+                    return value
+
+            stamp = cache_stamp(device_id)
+            value = func(*args, **kwargs)
+            until = valid_until(value) if valid_until else None
+            read_cache[key] = (stamp, minute, time.monotonic() + seconds, until, value)
+            return value
+        return wrapper
+    return decorator
+
+# Minutes in a week - schedule bitmaps have one byte per minute, Monday 00:00 first
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+# Per-device schedule bitmap: device_id -> (cache_stamp, bitmap or None if the device has no schedules)
+schedule_bitmaps = {}
+
+# Per-device sorted schedule start times as minute of week: device_id -> (cache_stamp, [start, ...])
+schedule_starts = {}
+
+def invalidate_cache(device_id=None):
+    """
+    Discard memoized reads - call after any write
+    Pass the device_id when the write only touched that device's schedules or overrides
+    """
+    global cache_generation
+    if device_id is None:
+        cache_generation += 1
+        read_cache.clear()
+        schedule_bitmaps.clear()
+        schedule_starts.clear()
+    else:
+        device_generations[device_id] = device_generations.get(device_id, 0) + 1
+        # Reads made without a device_id resolve to the default device, which may be this one
+        device_generations[None] = device_generations.get(None, 0) + 1
+        schedule_bitmaps.pop(device_id, None)
+        schedule_starts.pop(device_id, None)
+
+def set_timezone(name):
+    """Change the configured timezone at runtime (e.g. for tests)"""
+    global TIMEZONE, LOCAL_TZ
+    TIMEZONE = name
+    LOCAL_TZ = ZoneInfo(name)
+    invalidate_cache()
+
 def get_local_now():
     """Get current time in configured timezone"""
-    return datetime.now(ZoneInfo(TIMEZONE))
+    return datetime.now(LOCAL_TZ)
+
+def to_epoch(dt):
+    """Convert an aware datetime to the Unix epoch seconds stored in the database"""
+    return int(dt.timestamp())
+
+def from_epoch(seconds):
+    """Convert stored Unix epoch seconds to a datetime in the configured timezone"""
+    return datetime.fromtimestamp(seconds, LOCAL_TZ)
+
+def iso_to_epoch(value):
+    """Convert an ISO timestamp written by older versions to epoch seconds (naive ones are local time)"""
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=LOCAL_TZ)
+    return to_epoch(dt)
+
+# Default device id as (cache_generation, id) - device writes bump the global generation
+default_device_id_cache = None
 
 def get_default_device_id():
-    """Get the default device ID"""
+    """Get the default device ID, re-read only after a write that may have changed it"""
+    global default_device_id_cache
+    cached = default_device_id_cache
+    if cached and cached[0] == cache_generation:
+        return cached[1]
+
+    generation = cache_generation
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT id FROM devices WHERE is_default = 1 LIMIT 1")
+        cursor.execute(SELECT_DEFAULT_DEVICE_ID_SQL)
         row = cursor.fetchone()
-        return row[0] if row else None
+        default_device_id = row[0] if row else None
+    default_device_id_cache = (generation, default_device_id)
+    return default_device_id
+
+def open_db():
+    """Open the shared connection and apply the per-connection settings"""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+    # Write-ahead logging keeps commits cheap and lets outside readers (e.g. the sqlite3 CLI) work during writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Safe with WAL - only skips the fsync on each commit, not the one at checkpoint
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Page cache up to 64 MB and memory-mapped reads up to 256 MB - both only grow as far as the file does
+    conn.execute("PRAGMA cache_size=-64000")
+    conn.execute("PRAGMA mmap_size=268435456")
+    # Off by default in SQLite - without it the ON DELETE CASCADE on device_id never fires
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+def close_db():
+    """Close the shared connection (registered to run at exit so the WAL is checkpointed)"""
+    global db_conn
+    with db_lock:
+        if db_conn is not None:
+            db_conn.close()
+            db_conn = None
+
+atexit.register(close_db)
 
 @contextmanager
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+    """
+    Use the shared connection, holding db_lock for the whole block
+    Anything left uncommitted (e.g. a write that raised) is rolled back when the outermost
+    block exits - nested blocks (helpers called mid-transaction) leave the caller's work alone
+    """
+    global db_conn, db_depth
+    with db_lock:
+        if db_conn is None:
+            db_conn = open_db()
+        db_depth += 1
+        try:
+            yield db_conn
+        finally:
+            db_depth -= 1
+            if db_depth == 0 and db_conn.in_transaction:
+                db_conn.rollback()
 
 def init_db():
-    """Initialize the database schema"""
+    """
+    Initialize the database schema
+    All DDL and migrations run in one transaction (sqlite3 only opens one implicitly before
+    DML), so startup pays for a single commit and a failed migration leaves nothing half-done
+    """
     with get_db() as conn:
         cursor = conn.cursor()
+        cursor.execute("BEGIN")
 
         # Devices table - stores switch configurations
         cursor.execute("""
@@ -65,10 +313,10 @@ def init_db():
                     INSERT INTO devices (alias, ip, username, password, port_id, is_default)
                     VALUES (?, ?, ?, ?, ?, 1)
                 """, (default_alias, default_ip, default_username, default_password, default_port_id))
-                print(f"Initial setup: Created device '{default_alias}' from environment variables")
+                logger.info("Initial setup: Created device '%s' from environment variables", default_alias)
             else:
-                print("WARNING: No SWITCH_IP in environment and no devices in database.")
-                print("Please configure devices via the web UI at /config")
+                logger.warning("No SWITCH_IP in environment and no devices in database. "
+                               "Please configure devices via the web UI at /config")
 
         # Check if schedules table exists and needs migration (add device_id column)
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='schedules'")
@@ -82,8 +330,11 @@ def init_db():
             needs_migration = False
 
         if schedules_exists and needs_migration:
-            # Get default device id for migration
-            default_device_id = get_default_device_id()
+            # Get default device id for migration - through this transaction's cursor, since the
+            # device created above is not committed yet
+            cursor.execute(SELECT_DEFAULT_DEVICE_ID_SQL)
+            row = cursor.fetchone()
+            default_device_id = row[0] if row else None
 
             # Rename old tables
             cursor.execute("ALTER TABLE schedules RENAME TO schedules_old")
@@ -99,6 +350,8 @@ def init_db():
                     start_time TEXT NOT NULL,
                     end_time TEXT NOT NULL,
                     enabled INTEGER DEFAULT 1,
+                    start_min INTEGER,
+                    end_min INTEGER,
                     FOREIGN KEY (device_id) REFERENCES devices(id) ON DELETE CASCADE,
                     UNIQUE(device_id, day_of_week, start_time, end_time)
                 )
@@ -108,8 +361,8 @@ def init_db():
                 CREATE TABLE temporary_access (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     device_id INTEGER NOT NULL,
-                    granted_at TEXT NOT NULL,
-                    expires_at TEXT NOT NULL,
+                    granted_at INTEGER NOT NULL,
+                    expires_at INTEGER NOT NULL,
                     active INTEGER DEFAULT 1,
                     FOREIGN KEY (device_id) REFERENCES devices(id) ON DELETE CASCADE
                 )
@@ -119,8 +372,8 @@ def init_db():
                 CREATE TABLE punishment_mode (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     device_id INTEGER NOT NULL,
-                    activated_at TEXT NOT NULL,
-                    expires_at TEXT NOT NULL,
+                    activated_at INTEGER NOT NULL,
+                    expires_at INTEGER NOT NULL,
                     active INTEGER DEFAULT 1,
                     FOREIGN KEY (device_id) REFERENCES devices(id) ON DELETE CASCADE
                 )
@@ -128,23 +381,23 @@ def init_db():
 
             # Migrate existing data if default device exists
             if default_device_id:
-                cursor.execute(f"""
+                cursor.execute("""
                     INSERT INTO schedules (device_id, day_of_week, start_time, end_time, enabled)
-                    SELECT {default_device_id}, day_of_week, start_time, end_time, enabled
+                    SELECT ?, day_of_week, start_time, end_time, enabled
                     FROM schedules_old
-                """)
+                """, (default_device_id,))
 
-                cursor.execute(f"""
+                cursor.execute("""
                     INSERT INTO temporary_access (device_id, granted_at, expires_at, active)
-                    SELECT {default_device_id}, granted_at, expires_at, active
+                    SELECT ?, granted_at, expires_at, active
                     FROM temporary_access_old
-                """)
+                """, (default_device_id,))
 
-                cursor.execute(f"""
+                cursor.execute("""
                     INSERT INTO punishment_mode (device_id, activated_at, expires_at, active)
-                    SELECT {default_device_id}, activated_at, expires_at, active
+                    SELECT ?, activated_at, expires_at, active
                     FROM punishment_mode_old
-                """)
+                """, (default_device_id,))
 
             # Drop old tables
             cursor.execute("DROP TABLE schedules_old")
@@ -160,6 +413,8 @@ def init_db():
                     start_time TEXT NOT NULL,
                     end_time TEXT NOT NULL,
                     enabled INTEGER DEFAULT 1,
+                    start_min INTEGER,
+                    end_min INTEGER,
                     FOREIGN KEY (device_id) REFERENCES devices(id) ON DELETE CASCADE,
                     UNIQUE(device_id, day_of_week, start_time, end_time)
                 )
@@ -169,9 +424,9 @@ def init_db():
                 CREATE TABLE IF NOT EXISTS temporary_access (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     device_id INTEGER NOT NULL,
-                    granted_at TEXT NOT NULL,
-                    expires_at TEXT NOT NULL,
-                    active INTEGER DEFAULT 1,
+                    granted_at INTEGER NOT NULL,
+                    expires_at INTEGER NOT NULL,
+                    revoked_at INTEGER,
                     FOREIGN KEY (device_id) REFERENCES devices(id) ON DELETE CASCADE
                 )
             """)
@@ -180,13 +435,83 @@ def init_db():
                 CREATE TABLE IF NOT EXISTS punishment_mode (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     device_id INTEGER NOT NULL,
-                    activated_at TEXT NOT NULL,
-                    expires_at TEXT NOT NULL,
-                    active INTEGER DEFAULT 1,
+                    activated_at INTEGER NOT NULL,
+                    expires_at INTEGER NOT NULL,
+                    revoked_at INTEGER,
                     FOREIGN KEY (device_id) REFERENCES devices(id) ON DELETE CASCADE
                 )
             """)
 
+        # Add minute-of-day columns (0-1439) for schedule times if this database predates them
+        cursor.execute("PRAGMA table_info(schedules)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if 'start_min' not in columns:
+            cursor.execute("ALTER TABLE schedules ADD COLUMN start_min INTEGER")
+            cursor.execute("ALTER TABLE schedules ADD COLUMN end_min INTEGER")
+
+        # Fill them in for rows written before the columns existed (or copied by the migration above)
+        cursor.execute("""
+            UPDATE schedules
+            SET start_min = CAST(substr(start_time, 1, instr(start_time, ':') - 1) AS INTEGER) * 60
+                          + CAST(substr(start_time, instr(start_time, ':') + 1) AS INTEGER),
+                end_min = CAST(substr(end_time, 1, instr(end_time, ':') - 1) AS INTEGER) * 60
+                        + CAST(substr(end_time, instr(end_time, ':') + 1) AS INTEGER)
+            WHERE start_min IS NULL OR end_min IS NULL
+        """)
+
+        # Override times are Unix epoch seconds - convert databases that stored ISO strings
+        for table, started_column in (("temporary_access", "granted_at"), ("punishment_mode", "activated_at")):
+            cursor.execute(f"PRAGMA table_info({table})")
+            column_types = {column[1]: column[2] for column in cursor.fetchall()}
+            if column_types['expires_at'] != 'INTEGER':
+                # Rebuild with INTEGER columns - a TEXT column would store the converted numbers as text
+                cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+                cursor.execute(f"""
+                    CREATE TABLE {table} (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        device_id INTEGER NOT NULL,
+                        {started_column} INTEGER NOT NULL,
+                        expires_at INTEGER NOT NULL,
+                        active INTEGER DEFAULT 1,
+                        FOREIGN KEY (device_id) REFERENCES devices(id) ON DELETE CASCADE
+                    )
+                """)
+                cursor.execute(f"""
+                    INSERT INTO {table} (id, device_id, {started_column}, expires_at, active)
+                    SELECT id, device_id, {started_column}, expires_at, active FROM {table}_old
+                """)
+                cursor.execute(f"DROP TABLE {table}_old")
+
+            cursor.execute(f"""
+                SELECT id, {started_column}, expires_at FROM {table}
+                WHERE typeof({started_column}) = 'text' OR typeof(expires_at) = 'text'
+            """)
+            cursor.executemany(
+                f"UPDATE {table} SET {started_column} = ?, expires_at = ? WHERE id = ?",
+                [(iso_to_epoch(row[1]), iso_to_epoch(row[2]), row[0]) for row in cursor.fetchall()]
+            )
+
+        # An override is in effect exactly while expires_at is in the future - replace the old
+        # active flag: rows switched off before their expiry were revoked, so end them now
+        now_epoch = to_epoch(get_local_now())
+        for table in ("temporary_access", "punishment_mode"):
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = [column[1] for column in cursor.fetchall()]
+            if 'active' in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN revoked_at INTEGER")
+                cursor.execute(f"""
+                    UPDATE {table} SET expires_at = ?1, revoked_at = ?1
+                    WHERE active = 0 AND expires_at > ?1
+                """, (now_epoch,))
+                for index in cursor.execute(f"PRAGMA index_list({table})").fetchall():
+                    if not index[1].startswith("sqlite_"):
+                        cursor.execute(f"DROP INDEX {index[1]}")
+                cursor.execute(f"ALTER TABLE {table} DROP COLUMN active")
+
+        # Remove rows left behind by devices deleted before foreign keys were enforced
+        for table in ("schedules", "temporary_access", "punishment_mode"):
+            cursor.execute(f"DELETE FROM {table} WHERE device_id NOT IN (SELECT id FROM devices)")
+
         # Settings table - stores app-level configuration
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS settings (
@@ -195,72 +520,109 @@ def init_db():
             )
         """)
 
+        # Indexes for the hot lookups: per-device current overrides, next-expiry scans
+        # across all devices, and per-device schedules in display order
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_temp_device_expires
+            ON temporary_access(device_id, expires_at)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_temp_expires
+            ON temporary_access(expires_at)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_punish_device_expires
+            ON punishment_mode(device_id, expires_at)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_punish_expires
+            ON punishment_mode(expires_at)
+        """)
+        # Ordered by the integer start minute - the text start_time sorts "10:00" before "7:05"
+        cursor.execute("DROP INDEX IF EXISTS idx_schedules_device_day")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_schedules_device_day_start
+            ON schedules(device_id, enabled, day_of_week, start_min)
+        """)
+        # Partial index holding only the default device, so its lookup on every request is a single probe
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_devices_default
+            ON devices(is_default) WHERE is_default = 1
+        """)
+
         conn.commit()
+        # Refresh planner statistics for tables and indexes that need it (usually a no-op)
+        cursor.execute("PRAGMA optimize")
+        invalidate_cache()
 
 def get_devices():
-    """Get all devices"""
+    """
+    Get all devices as sqlite3.Row objects (read-only, indexable by column name)
+    Convert with dict() before serializing or modifying
+    """
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM devices ORDER BY is_default DESC, alias")
-        return [dict(row) for row in cursor.fetchall()]
+        return conn.execute("SELECT * FROM devices ORDER BY is_default DESC, alias").fetchall()
 
 def get_device(device_id):
-    """Get a specific device by ID"""
+    """Get a specific device by ID as a sqlite3.Row (see get_devices), or None"""
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM devices WHERE id = ?", (device_id,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+        return conn.execute(SELECT_DEVICE_SQL, (device_id,)).fetchone()
 
 def add_device(alias, ip, username, password, port_id, is_default=False):
     """Add a new device"""
     with get_db() as conn:
-        cursor = conn.cursor()
-
-        # If this is being set as default, unset other defaults
-        if is_default:
-            cursor.execute("UPDATE devices SET is_default = 0")
-
-        cursor.execute("""
-            INSERT INTO devices (alias, ip, username, password, port_id, is_default)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (alias, ip, username, password, port_id, 1 if is_default else 0))
-        conn.commit()
+        with conn:
+            # If this is being set as default, unset other defaults
+            if is_default:
+                conn.execute("UPDATE devices SET is_default = 0")
+
+            cursor = conn.execute("""
+                INSERT INTO devices (alias, ip, username, password, port_id, is_default)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (alias, ip, username, password, port_id, 1 if is_default else 0))
+        invalidate_cache()
         return cursor.lastrowid
 
 def update_device(device_id, alias, ip, username, password, port_id, is_default=False):
     """Update an existing device"""
     with get_db() as conn:
-        cursor = conn.cursor()
-
-        # If this is being set as default, unset other defaults
-        if is_default:
-            cursor.execute("UPDATE devices SET is_default = 0 WHERE id != ?", (device_id,))
-
-        cursor.execute("""
-            UPDATE devices
-            SET alias = ?, ip = ?, username = ?, password = ?, port_id = ?, is_default = ?
-            WHERE id = ?
-        """, (alias, ip, username, password, port_id, 1 if is_default else 0, device_id))
-        conn.commit()
+        with conn:
+            # If this is being set as default, unset other defaults
+            if is_default:
+                conn.execute("UPDATE devices SET is_default = 0 WHERE id != ?", (device_id,))
+
+            conn.execute("""
+                UPDATE devices
+                SET alias = ?, ip = ?, username = ?, password = ?, port_id = ?, is_default = ?
+                WHERE id = ?
+            """, (alias, ip, username, password, port_id, 1 if is_default else 0, device_id))
+        invalidate_cache()
 
 def delete_device(device_id):
     """Delete a device (and all associated data via CASCADE)"""
     with get_db() as conn:
-        cursor = conn.cursor()
-
-        # Check if this is the default device
-        cursor.execute("SELECT is_default FROM devices WHERE id = ?", (device_id,))
-        row = cursor.fetchone()
-        if row and row[0] == 1:
-            # If deleting the default, make another device the default
-            cursor.execute("SELECT id FROM devices WHERE id != ? LIMIT 1", (device_id,))
-            new_default = cursor.fetchone()
-            if new_default:
-                cursor.execute("UPDATE devices SET is_default = 1 WHERE id = ?", (new_default[0],))
-
-        cursor.execute("DELETE FROM devices WHERE id = ?", (device_id,))
-        conn.commit()
+        with conn:
+            # Check if this is the default device
+            cursor = conn.execute("SELECT is_default FROM devices WHERE id = ?", (device_id,))
+            row = cursor.fetchone()
+            if row and row[0] == 1:
+                # If deleting the default, make another device the default
+                cursor = conn.execute("SELECT id FROM devices WHERE id != ? LIMIT 1", (device_id,))
+                new_default = cursor.fetchone()
+                if new_default:
+                    conn.execute("UPDATE devices SET is_default = 1 WHERE id = ?", (new_default[0],))
+
+            conn.execute("DELETE FROM devices WHERE id = ?", (device_id,))
+        invalidate_cache()
+
+def schedule_row(device_id, day_of_week, start_time, end_time):
+    """
+    Parameters for INSERT_SCHEDULE_SQL - the minute columns are what all comparisons use,
+    and the "HH:MM" text is rewritten from them so "7:05" and "07:05" are the same schedule
+    """
+    start_min = time_to_minutes(start_time)
+    end_min = time_to_minutes(end_time)
+    return (device_id, day_of_week, minutes_to_time(start_min), minutes_to_time(end_min), start_min, end_min)
 
 def add_schedule(day_of_week, start_time, end_time, device_id=None):
     """
@@ -274,14 +636,36 @@ def add_schedule(day_of_week, start_time, end_time, device_id=None):
         device_id = get_default_device_id()
 
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT OR REPLACE INTO schedules (device_id, day_of_week, start_time, end_time, enabled)
-            VALUES (?, ?, ?, ?, 1)
-        """, (device_id, day_of_week, start_time, end_time))
-        conn.commit()
+        with conn:
+            cursor = conn.execute(INSERT_SCHEDULE_SQL, schedule_row(device_id, day_of_week, start_time, end_time))
+        invalidate_cache(device_id)
         return cursor.lastrowid
 
+def add_schedules(items, device_id=None):
+    """
+    Add several weekly schedules in one transaction (e.g. a whole week at once)
+    items: (day_of_week, start_time, end_time) tuples, same formats as add_schedule
+    device_id: Device ID (defaults to default device)
+    Returns the number of schedules added
+    """
+    if device_id is None:
+        device_id = get_default_device_id()
+
+    # Parse every row before writing so a bad time leaves the schedules untouched
+    rows = [
+        schedule_row(device_id, day_of_week, start_time, end_time)
+        for day_of_week, start_time, end_time in items
+    ]
+    if not rows:
+        return 0
+
+    with get_db() as conn:
+        with conn:
+            conn.executemany(INSERT_SCHEDULE_SQL, rows)
+        invalidate_cache(device_id)
+        return len(rows)
+
+@ttl_cached()
 def get_schedules(device_id=None):
     """Get all schedules for a device"""
     if device_id is None:
@@ -289,170 +673,157 @@ def get_schedules(device_id=None):
 
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM schedules
-            WHERE device_id = ? AND enabled = 1
-            ORDER BY day_of_week, start_time
-        """, (device_id,))
+        cursor.execute(SELECT_SCHEDULES_SQL, (device_id,))
         return [dict(row) for row in cursor.fetchall()]
 
 def delete_schedule(schedule_id):
     """Delete a schedule by ID"""
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM schedules WHERE id = ?", (schedule_id,))
-        conn.commit()
+        with conn:
+            cursor = conn.execute("SELECT device_id FROM schedules WHERE id = ?", (schedule_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return
+            conn.execute("DELETE FROM schedules WHERE id = ?", (schedule_id,))
+        invalidate_cache(row['device_id'])
 
 def grant_temporary_access(duration_minutes, device_id=None):
     """
     Grant temporary access for a specified duration
     If temp access is already active, extends it by the additional duration
-    Returns the expiration time
+    Returns (grant details, whether the port should now be enabled)
     """
     if device_id is None:
         device_id = get_default_device_id()
 
-    now = get_local_now()
-
-    # Check if there's already active temporary access
-    existing = get_active_temporary_access(device_id)
-
-    if existing:
-        # Extend existing access by adding duration to current expiration
-        current_expires = datetime.fromisoformat(existing['expires_at'])
-        new_expires = current_expires + timedelta(minutes=duration_minutes)
-
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE temporary_access
-                SET expires_at = ?
-                WHERE id = ?
-            """, (new_expires.isoformat(), existing['id']))
-            conn.commit()
-            return {
-                "id": existing['id'],
-                "granted_at": existing['granted_at'],
-                "expires_at": new_expires.isoformat(),
-                "extended": True
-            }
-    else:
-        # Create new temporary access
-        expires_at = now + timedelta(minutes=duration_minutes)
-
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO temporary_access (device_id, granted_at, expires_at, active)
-                VALUES (?, ?, ?, 1)
-            """, (device_id, now.isoformat(), expires_at.isoformat()))
-            conn.commit()
-            return {
-                "id": cursor.lastrowid,
-                "granted_at": now.isoformat(),
-                "expires_at": expires_at.isoformat(),
-                "extended": False
-            }
+    # Temporary access enables the port unless punishment mode overrides it
+    should_be_enabled = get_active_punishment_mode(device_id) is None
 
+    with get_db() as conn:
+        with conn:
+            row = conn.execute(EXTEND_TEMPORARY_ACCESS_SQL, (device_id, duration_minutes * 60)).fetchone()
+            extended = row is not None
+            if not extended:
+                row = conn.execute(INSERT_TEMPORARY_ACCESS_SQL, (device_id, duration_minutes * 60)).fetchone()
+        invalidate_cache(device_id)
+
+    return {
+        "id": row['id'],
+        "granted_at": row['granted_at'],
+        "expires_at": row['expires_at'],
+        "extended": extended
+    }, should_be_enabled
+
+@ttl_cached(valid_until=override_expiry)
 def get_active_temporary_access(device_id=None):
     """Get active temporary access grant (if any)"""
     if device_id is None:
         device_id = get_default_device_id()
 
-    now = get_local_now().isoformat()
+    now = to_epoch(get_local_now())
 
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM temporary_access
-            WHERE device_id = ? AND active = 1 AND expires_at > ?
-            ORDER BY expires_at DESC
-            LIMIT 1
-        """, (device_id, now))
+        cursor.execute(SELECT_ACTIVE_TEMPORARY_ACCESS_SQL, (device_id, now))
         row = cursor.fetchone()
         return dict(row) if row else None
 
-def cleanup_expired_temporary_access(device_id=None):
-    """Mark expired temporary access grants as inactive"""
-    now = get_local_now().isoformat()
-
-    with get_db() as conn:
-        cursor = conn.cursor()
-        if device_id is None:
-            # Cleanup for all devices
-            cursor.execute("""
-                UPDATE temporary_access
-                SET active = 0
-                WHERE active = 1 AND expires_at <= ?
-            """, (now,))
-        else:
-            # Cleanup for specific device
-            cursor.execute("""
-                UPDATE temporary_access
-                SET active = 0
-                WHERE device_id = ? AND active = 1 AND expires_at <= ?
-            """, (device_id, now))
-        conn.commit()
-
 def revoke_temporary_access(device_id=None):
-    """Revoke active temporary access"""
+    """
+    Revoke active temporary access
+    Returns whether the port should now be enabled
+    """
     if device_id is None:
         device_id = get_default_device_id()
 
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE temporary_access
-            SET active = 0
-            WHERE device_id = ? AND active = 1
-        """, (device_id,))
-        conn.commit()
+        with conn:
+            # End it now - the row stays, marked with when it was revoked
+            conn.execute(f"""
+                UPDATE temporary_access
+                SET expires_at = {NOW_EPOCH_SQL}, revoked_at = {NOW_EPOCH_SQL}
+                WHERE device_id = ? AND expires_at > {NOW_EPOCH_SQL}
+            """, (device_id,))
+        invalidate_cache(device_id)
+
+    return should_port_be_enabled(device_id)
 
 def get_next_schedule_start(device_id=None):
     """
     Calculate when the next schedule window starts
+    Bisects the device's cached, sorted start minutes rather than asking SQLite, so a
+    warm call is one binary search plus one datetime construction
     Returns datetime or None if no schedules
     """
     if device_id is None:
         device_id = get_default_device_id()
 
+    starts = get_schedule_starts(device_id)
+    if not starts:
+        return None
+
     now = get_local_now()
-    current_day = now.weekday()
-    current_time = now.strftime("%H:%M")
+    now_minute_of_week = now.weekday() * 24 * 60 + now.hour * 60 + now.minute
+
+    # First start after the current minute, or the earliest one next week
+    i = bisect_right(starts, now_minute_of_week)
+    start = starts[i] if i < len(starts) else starts[0] + MINUTES_PER_WEEK
+
+    days_ahead = start // (24 * 60) - now.weekday()
+    target_date = now.date() + timedelta(days=days_ahead)
+    minute_of_day = start % (24 * 60)
+    return datetime(
+        target_date.year,
+        target_date.month,
+        target_date.day,
+        minute_of_day // 60,
+        minute_of_day % 60,
+        tzinfo=now.tzinfo
+    )
+
+def next_transition_time():
+    """
+    Calculate when the desired port state of any device can next change:
+    a schedule window starting or ending, or temporary access / punishment mode expiring
+    Returns datetime or None if nothing is pending
+    """
+    now = get_local_now()
+    now_epoch = to_epoch(now)
 
-    schedules = get_schedules(device_id)
-    if not schedules:
-        return None
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT day_of_week, start_min, end_min FROM schedules WHERE enabled = 1")
+        schedules = cursor.fetchall()
+        cursor.execute(NEXT_OVERRIDE_EXPIRY_SQL, (now_epoch,))
+        expiries = cursor.fetchone()
 
-    # Look for next schedule starting today or in the next 7 days
-    for day_offset in range(8):
-        check_day = (current_day + day_offset) % 7
-        day_schedules = [s for s in schedules if s['day_of_week'] == check_day]
-
-        for schedule in sorted(day_schedules, key=lambda x: x['start_time']):
-            # If checking today, only consider future times
-            if day_offset == 0 and schedule['start_time'] <= current_time:
-                continue
-
-            # Calculate the datetime for this schedule start
-            days_ahead = day_offset
-            target_date = now.date() + timedelta(days=days_ahead)
-            hour, minute = map(int, schedule['start_time'].split(':'))
-            target_datetime = datetime(
-                target_date.year,
-                target_date.month,
-                target_date.day,
-                hour,
-                minute,
-                tzinfo=now.tzinfo
-            )
-            return target_datetime
+    candidates = [from_epoch(expires) for expires in expiries if expires]
 
-    return None
+    # Schedule windows are inclusive of their end minute, so the port turns off
+    # one minute after end_time. Check this week's and next week's occurrence.
+    for schedule in schedules:
+        days_ahead = (schedule['day_of_week'] - now.weekday()) % 7
+        for day_offset in (days_ahead, days_ahead + 7):
+            target_date = now.date() + timedelta(days=day_offset)
+            for minutes, delta in ((schedule['start_min'], timedelta(0)), (schedule['end_min'], timedelta(minutes=1))):
+                boundary = datetime(
+                    target_date.year,
+                    target_date.month,
+                    target_date.day,
+                    minutes // 60,
+                    minutes % 60,
+                    tzinfo=now.tzinfo
+                ) + delta
+                if boundary > now:
+                    candidates.append(boundary)
+
+    return min(candidates) if candidates else None
 
 def activate_punishment_mode(device_id=None):
     """
     Activate punishment mode - disables internet until next schedule starts
+    Returns (punishment details, whether the port should now be enabled - always False),
+    or (None, None) if there are no schedules
     """
     if device_id is None:
         device_id = get_default_device_id()
@@ -462,109 +833,245 @@ def activate_punishment_mode(device_id=None):
 
     if not next_start:
         # No schedules, can't activate punishment mode
-        return None
+        return None, None
 
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO punishment_mode (device_id, activated_at, expires_at, active)
-            VALUES (?, ?, ?, 1)
-        """, (device_id, now.isoformat(), next_start.isoformat()))
-        conn.commit()
+        with conn:
+            cursor = conn.execute("""
+                INSERT INTO punishment_mode (device_id, activated_at, expires_at)
+                VALUES (?, ?, ?)
+            """, (device_id, to_epoch(now), to_epoch(next_start)))
+        invalidate_cache(device_id)
         return {
             "id": cursor.lastrowid,
-            "activated_at": now.isoformat(),
-            "expires_at": next_start.isoformat()
-        }
+            "activated_at": to_epoch(now),
+            "expires_at": to_epoch(next_start)
+        }, False
 
+@ttl_cached(valid_until=override_expiry)
 def get_active_punishment_mode(device_id=None):
     """Get active punishment mode (if any)"""
     if device_id is None:
         device_id = get_default_device_id()
 
-    now = get_local_now().isoformat()
+    now = to_epoch(get_local_now())
 
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM punishment_mode
-            WHERE device_id = ? AND active = 1 AND expires_at > ?
-            ORDER BY expires_at DESC
-            LIMIT 1
-        """, (device_id, now))
+        cursor.execute(SELECT_ACTIVE_PUNISHMENT_MODE_SQL, (device_id, now))
         row = cursor.fetchone()
         return dict(row) if row else None
 
-def cleanup_expired_punishment_mode(device_id=None):
-    """Mark expired punishment mode as inactive"""
-    now = get_local_now().isoformat()
-
-    with get_db() as conn:
-        cursor = conn.cursor()
-        if device_id is None:
-            # Cleanup for all devices
-            cursor.execute("""
-                UPDATE punishment_mode
-                SET active = 0
-                WHERE active = 1 AND expires_at <= ?
-            """, (now,))
-        else:
-            # Cleanup for specific device
-            cursor.execute("""
-                UPDATE punishment_mode
-                SET active = 0
-                WHERE device_id = ? AND active = 1 AND expires_at <= ?
-            """, (device_id, now))
-        conn.commit()
-
 def revoke_punishment_mode(device_id=None):
-    """Revoke active punishment mode"""
+    """
+    Revoke active punishment mode
+    Returns whether the port should now be enabled
+    """
     if device_id is None:
         device_id = get_default_device_id()
 
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE punishment_mode
-            SET active = 0
-            WHERE device_id = ? AND active = 1
-        """, (device_id,))
-        conn.commit()
+        with conn:
+            # End it now - the row stays, marked with when it was revoked
+            conn.execute(f"""
+                UPDATE punishment_mode
+                SET expires_at = {NOW_EPOCH_SQL}, revoked_at = {NOW_EPOCH_SQL}
+                WHERE device_id = ? AND expires_at > {NOW_EPOCH_SQL}
+            """, (device_id,))
+        invalidate_cache(device_id)
 
-def should_port_be_enabled(device_id=None):
+    return should_port_be_enabled(device_id)
+
+def time_to_minutes(time_str):
+    """Convert "HH:MM" to minutes since midnight"""
+    hour, minute = map(int, time_str.split(':'))
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Invalid time: {time_str}")
+    return hour * 60 + minute
+
+def minutes_to_time(minutes):
+    """Convert minutes since midnight to "HH:MM" (zero-padded)"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def build_schedule_bitmap(schedules):
     """
-    Determine if the port should be enabled based on schedules and overrides
-    Priority: punishment mode (highest) > temporary access > schedule > default (enabled)
+    Build a minute-of-week bitmap for a device's schedules: byte 1 where the port
+    should be enabled, so checking a time is a single index
+    Returns None if there are no schedules (the port then defaults to enabled)
     """
-    if device_id is None:
-        device_id = get_default_device_id()
+    if not schedules:
+        return None
 
-    # Check for active punishment mode first (highest priority - always disables)
-    punishment = get_active_punishment_mode(device_id)
+    bitmap = bytearray(MINUTES_PER_WEEK)
+    for schedule in schedules:
+        start = schedule['start_min']
+        end = schedule['end_min']
+        # Windows don't wrap past midnight - a start after the end never matches
+        if start <= end:
+            offset = schedule['day_of_week'] * 24 * 60
+            bitmap[offset + start:offset + end + 1] = b"\x01" * (end - start + 1)
+    return bytes(bitmap)
+
+def get_schedule_bitmap(device_id, schedules=None, stamp=None):
+    """
+    Get the schedule bitmap for a device, rebuilding it after any write to the device
+    Callers that already read the schedules pass them with the cache_stamp taken *before*
+    reading them, so rows from before a concurrent write are never cached as current
+    """
+    if schedules is None:
+        stamp = cache_stamp(device_id)
+    elif stamp is None:
+        # Rows of unknown age - build from them but don't cache
+        return build_schedule_bitmap(schedules)
+
+    cached = schedule_bitmaps.get(device_id)
+    if cached and cached[0] == stamp == cache_stamp(device_id):
+        return cached[1]
+
+    if schedules is None:
+        schedules = get_schedules(device_id)
+    bitmap = build_schedule_bitmap(schedules)
+    schedule_bitmaps[device_id] = (stamp, bitmap)
+    return bitmap
+
+def get_schedule_starts(device_id, schedules=None, stamp=None):
+    """
+    Get a device's schedule start times as sorted minutes of the week, re-sorted after any write to the device
+    schedules and stamp work as in get_schedule_bitmap
+    """
+    if schedules is None:
+        stamp = cache_stamp(device_id)
+    elif stamp is None:
+        return sorted(schedule['day_of_week'] * 24 * 60 + schedule['start_min'] for schedule in schedules)
+
+    cached = schedule_starts.get(device_id)
+    if cached and cached[0] == stamp == cache_stamp(device_id):
+        return cached[1]
+
+    if schedules is None:
+        schedules = get_schedules(device_id)
+    starts = sorted(schedule['day_of_week'] * 24 * 60 + schedule['start_min'] for schedule in schedules)
+    schedule_starts[device_id] = (stamp, starts)
+    return starts
+
+def is_within_schedule(schedule_bitmap, now):
+    """Check if a time falls within any window of a schedule bitmap"""
+    # 0=Monday, 6=Sunday
+    return schedule_bitmap[now.weekday() * 24 * 60 + now.hour * 60 + now.minute] == 1
+
+def evaluate_port_state(punishment, temp_access, schedule_bitmap, now):
+    """
+    Decide if the port should be enabled from already-fetched overrides and a schedule bitmap
+    Priority: punishment mode (highest) > temporary access > schedule > default (enabled)
+    """
+    # Active punishment mode always disables
     if punishment:
         return False
 
-    # Check for active temporary access (overrides schedule to enable)
-    temp_access = get_active_temporary_access(device_id)
+    # Active temporary access overrides schedule to enable
     if temp_access:
         return True
 
-    # Check schedules using local time
+    # If no schedules, default to enabled
+    if schedule_bitmap is None:
+        return True
+
+    return is_within_schedule(schedule_bitmap, now)
+
+def should_port_be_enabled(device_id=None):
+    """
+    Determine if the port should be enabled based on schedules and overrides
+    Priority: punishment mode (highest) > temporary access > schedule > default (enabled)
+    """
+    if device_id is None:
+        device_id = get_default_device_id()
     now = get_local_now()
-    current_day = now.weekday()  # 0=Monday, 6=Sunday
-    current_time = now.strftime("%H:%M")
 
-    schedules = get_schedules(device_id)
+    # One round trip for both overrides; the schedule check runs against the in-memory bitmap
+    with get_db() as conn:
+        overrides = conn.execute(SELECT_ACTIVE_OVERRIDES_SQL, (device_id, to_epoch(now))).fetchone()
 
-    # If no schedules, default to enabled
-    if not schedules:
-        return True
+    return evaluate_port_state(
+        overrides['punished_until'] is not None,
+        overrides['temp_access_until'] is not None,
+        get_schedule_bitmap(device_id),
+        now
+    )
 
-    # Check if current time falls within any schedule for today
-    for schedule in schedules:
-        if schedule['day_of_week'] == current_day:
-            if schedule['start_time'] <= current_time <= schedule['end_time']:
-                return True
+def get_full_state(device_id=None, now=None):
+    """
+    Get schedules, active overrides and the resulting port decision for a device,
+    for the status and debug endpoints
+    Built from the memoized per-device reads, so repeat polls within the cache window
+    don't touch SQLite; a cold read holds the connection once for all three queries
+    """
+    if device_id is None:
+        device_id = get_default_device_id()
+    if now is None:
+        now = get_local_now()
+
+    with get_db():
+        # Taken before the reads so a write landing after them can't be cached as current
+        stamp = cache_stamp(device_id)
+        schedules = get_schedules(device_id)
+        temp_access = get_active_temporary_access(device_id)
+        punishment = get_active_punishment_mode(device_id)
+
+    return {
+        "device_id": device_id,
+        "now": now,
+        "schedules": schedules,
+        "active_temporary_access": temp_access,
+        "active_punishment_mode": punishment,
+        "should_be_enabled": evaluate_port_state(
+            punishment, temp_access, get_schedule_bitmap(device_id, schedules, stamp), now
+        )
+    }
+
+def snapshot_desired_states(device_ids, now=None):
+    """
+    Work out whether each device's port should be enabled, reading all devices at once
+    with one query per table - used by every scheduler sync
+    Returns {device_id: should_be_enabled}
+    """
+    if now is None:
+        now = get_local_now()
+    now_epoch = to_epoch(now)
 
-    # No matching schedule found
-    return False
+    if not device_ids:
+        return {}
+
+    with get_db() as conn:
+        # Taken before the reads so a write landing after them can't be cached as current
+        stamps = {device_id: cache_stamp(device_id) for device_id in device_ids}
+        placeholders = ", ".join("?" * len(device_ids))
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT device_id, day_of_week, start_min, end_min FROM schedules
+            WHERE enabled = 1 AND device_id IN ({placeholders})
+        """, device_ids)
+        schedules_by_device = {device_id: [] for device_id in device_ids}
+        for row in cursor.fetchall():
+            schedules_by_device[row['device_id']].append(row)
+
+        cursor.execute(f"""
+            SELECT DISTINCT device_id FROM temporary_access
+            WHERE expires_at > ? AND device_id IN ({placeholders})
+        """, (now_epoch, *device_ids))
+        temp_access = {row['device_id'] for row in cursor.fetchall()}
+
+        cursor.execute(f"""
+            SELECT DISTINCT device_id FROM punishment_mode
+            WHERE expires_at > ? AND device_id IN ({placeholders})
+        """, (now_epoch, *device_ids))
+        punished = {row['device_id'] for row in cursor.fetchall()}
+
+    return {
+        device_id: evaluate_port_state(
+            device_id in punished,
+            device_id in temp_access,
+            get_schedule_bitmap(device_id, schedules, stamps[device_id]),
+            now
+        )
+        for device_id, schedules in schedules_by_device.items()
+    }
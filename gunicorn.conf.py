@@ -0,0 +1,18 @@
+"""
+Gunicorn settings for production (gunicorn loads this file from the working directory)
+
+Keep a single worker so port_states, the scheduler and the read cache live in one
+process. Concurrency comes from gthread: requests waiting on a switch each hold a
+thread, while idle keep-alive connections from polling browsers are parked without one.
+"""
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+worker_class = "gthread"
+workers = 1
+
+# Requests handled at once - raise if many clients hit slow switches at the same time
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Seconds to hold an idle client connection open, so pollers reuse it between requests
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "30"))
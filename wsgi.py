@@ -0,0 +1,10 @@
+"""
+WSGI entry point for production
+
+Server settings (single gthread worker, thread count, keep-alive) are in gunicorn.conf.py:
+
+    gunicorn --config gunicorn.conf.py wsgi:app
+"""
+from app import app, start_app
+
+start_app()